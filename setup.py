@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 import os
 import sys
+import shutil
 import subprocess
 import argparse
 
+_IS_WIN = os.name == 'nt'
+
+# Project cache root, shared with the NVD lookup cache. setup.py runs before
+# the dependencies are installed and can't import src, so this is duplicated
+# in src/reasoning/security_analyzer.py; keep the two in sync
+CACHE_ROOT = os.environ.get("AUTONOMOUS_SECURITY_AGENT_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "autonomous-security-agent")
+VENV_CACHE_DIR = os.path.join(CACHE_ROOT, "venv")
+
 def check_python_version():
     """Check if Python version is compatible"""
     min_version = (3, 8)
@@ -16,32 +26,192 @@ def check_python_version():
     
     return True
 
-def setup_environment():
+def run_command(cmd, env=None):
+    """Run a command to completion, raising CalledProcessError if it fails"""
+    if _IS_WIN or not hasattr(os, "posix_spawnp"):
+        subprocess.run(cmd, check=True, env=env)
+        return
+    
+    # posix_spawn starts the child without forking a copy of this interpreter
+    pid = os.posix_spawnp(cmd[0], cmd, os.environ if env is None else env)
+    _, status = os.waitpid(pid, 0)
+    
+    if os.WIFSIGNALED(status):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+    
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def get_llama_build_env():
+    """Get the environment for building llama-cpp-python with GPU acceleration"""
+    env = dict(os.environ)
+    
+    # Respect build flags the user already chose
+    if "CMAKE_ARGS" in env:
+        return env
+    
+    if shutil.which("nvidia-smi"):
+        env["CMAKE_ARGS"] = "-DLLAMA_CUBLAS=on"
+    elif sys.platform == "darwin":
+        env["CMAKE_ARGS"] = "-DLLAMA_METAL=on"
+    else:
+        return env
+    
+    env["FORCE_CMAKE"] = "1"
+    return env
+
+def install_requirements(python_path):
+    """Install the pinned requirements into the given interpreter"""
+    env = get_llama_build_env()
+    
+    # uv resolves and installs the same pin set far faster than pip
+    uv_path = shutil.which("uv")
+    if uv_path:
+        cmd = [uv_path, "pip", "install", "--python", python_path, "-r", "requirements.txt"]
+    else:
+        cmd = [python_path, "-m", "pip", "install", "--no-compile", "-r", "requirements.txt"]
+    
+    if "CMAKE_ARGS" in env:
+        # A cached wheel would be the CPU build, so compile llama-cpp-python
+        # from source for the flags to apply
+        print(f"Building llama-cpp-python with {env['CMAKE_ARGS']}")
+        if uv_path:
+            cmd += ["--no-binary-package", "llama-cpp-python", "--no-cache"]
+        else:
+            cmd += ["--no-binary", "llama-cpp-python", "--no-cache-dir"]
+    
+    # Keep pip quiet and non-interactive; bytecode is compiled lazily on first import
+    env.update(PIP_PROGRESS_BAR="off", PIP_DISABLE_PIP_VERSION_CHECK="1", PIP_NO_INPUT="1")
+    
+    run_command(cmd, env=env)
+
+def get_venv_cache_prefix():
+    """Get the archive name prefix shared by every cache of this checkout and build"""
+    import hashlib
+    
+    key = hashlib.sha256()
+    # A venv embeds absolute paths, so it can only be reused from the same checkout
+    key.update(os.path.abspath(".").encode())
+    # The llama-cpp-python build differs with the GPU backend it was compiled for
+    key.update(get_llama_build_env().get("CMAKE_ARGS", "").encode())
+    
+    return key.hexdigest()[:16]
+
+def get_venv_cache_path():
+    """Get the cache archive path for the current requirements and interpreter"""
+    import hashlib
+    import platform
+    
+    key = hashlib.sha256()
+    with open("requirements.txt", "rb") as f:
+        key.update(f.read())
+    key.update(sys.version.encode())
+    key.update(platform.platform().encode())
+    
+    return os.path.join(VENV_CACHE_DIR, f"{get_venv_cache_prefix()}-{key.hexdigest()[:16]}.tar.gz")
+
+def restore_venv_cache(venv_dir):
+    """Unpack a cached virtual environment, returns True if one was found"""
+    import tarfile
+    
+    cache_path = get_venv_cache_path()
+    if not os.path.exists(cache_path):
+        return False
+    
+    print(f"Restoring virtual environment from {cache_path}...")
+    try:
+        with tarfile.open(cache_path, "r:gz") as tar:
+            # The "tar" filter keeps the absolute interpreter symlinks a venv relies on
+            if hasattr(tarfile, "tar_filter"):
+                tar.extractall(".", filter="tar")
+            else:
+                tar.extractall(".")
+    except (OSError, tarfile.TarError) as e:
+        print(f"❌ Could not restore cached environment: {e}")
+        shutil.rmtree(venv_dir, ignore_errors=True)
+        return False
+    
+    return True
+
+def save_venv_cache(venv_dir):
+    """Pack the prepared virtual environment into the cache"""
+    import tarfile
+    
+    cache_path = get_venv_cache_path()
+    os.makedirs(VENV_CACHE_DIR, exist_ok=True)
+    
+    tmp_path = cache_path + ".tmp"
+    try:
+        with tarfile.open(tmp_path, "w:gz", compresslevel=1) as tar:
+            tar.add(venv_dir)
+        os.replace(tmp_path, cache_path)
+        print(f"✅ Virtual environment cached at {cache_path}")
+    except (OSError, tarfile.TarError) as e:
+        print(f"❌ Could not cache virtual environment: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    
+    # Older archives of this checkout and build were made for other requirements
+    # or interpreters and are never restored again; other checkouts keep theirs
+    prefix = get_venv_cache_prefix() + "-"
+    for name in os.listdir(VENV_CACHE_DIR):
+        path = os.path.join(VENV_CACHE_DIR, name)
+        if name.startswith(prefix) and name.endswith(".tar.gz") and path != cache_path:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Warning: Could not remove old cached environment {path}: {e}")
+
+def setup_environment(use_cache=True):
     """Set up a virtual environment and install dependencies"""
     venv_dir = "venv"
+    created = False
+    restored = False
     
     # Check if venv already exists
     if os.path.exists(venv_dir):
         print(f"✅ Virtual environment already exists at {venv_dir}")
+    elif use_cache and restore_venv_cache(venv_dir):
+        restored = True
+        print("✅ Virtual environment restored")
     else:
         print(f"Creating virtual environment in {venv_dir}...")
-        subprocess.run([sys.executable, "-m", "venv", venv_dir], check=True)
+        run_command([sys.executable, "-m", "venv", venv_dir])
+        created = True
         print(f"✅ Virtual environment created")
     
-    # Get path to pip in virtual environment
-    if os.name == 'nt':  # Windows
-        pip_path = os.path.join(venv_dir, "Scripts", "pip")
+    # Get path to python in virtual environment
+    if _IS_WIN:  # Windows
         python_path = os.path.join(venv_dir, "Scripts", "python")
     else:  # Unix/Mac
-        pip_path = os.path.join(venv_dir, "bin", "pip")
         python_path = os.path.join(venv_dir, "bin", "python")
     
-    print("Installing dependencies...")
-    subprocess.run([pip_path, "install", "-r", "requirements.txt"], check=True)
-    print("✅ Dependencies installed")
+    if restored:
+        print("✅ Dependencies already installed in cached environment")
+    else:
+        print("Installing dependencies...")
+        install_requirements(python_path)
+        print("✅ Dependencies installed")
     
     print("Installing Playwright browsers...")
-    subprocess.run([python_path, "-m", "playwright", "install", "chromium"], check=True)
+    browser_cmd = [python_path, "-m", "playwright", "install", "chromium"]
+    
+    if use_cache and created:
+        from concurrent.futures import ThreadPoolExecutor
+        
+        # Browsers download to the shared ms-playwright cache, not the venv, so
+        # the venv can be packed meanwhile; skip bytecode writes so it stays unchanged
+        browser_env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            cache_future = executor.submit(save_venv_cache, venv_dir)
+            browser_future = executor.submit(run_command, browser_cmd, browser_env)
+            browser_future.result()
+            cache_future.result()
+    else:
+        run_command(browser_cmd)
     print("✅ Playwright browsers installed")
     
     return venv_dir
@@ -123,6 +293,13 @@ log/
 
 # Security scan results
 scan_results/
+
+# Model test checkpoint of an interrupted run
+tests/results/checkpoint.json*
+
+# Model test summary tables
+tests/results/*.parquet
+tests/results/*.csv
 reports/
 
 # User-specific files
@@ -157,7 +334,7 @@ exec $SHELL
 """)
     
     # Make run.sh executable on Unix-like systems
-    if os.name != 'nt':
+    if not _IS_WIN:
         os.chmod("run.sh", 0o755)
     
     print("✅ Activation scripts created")
@@ -166,6 +343,7 @@ exec $SHELL
 def main():
     parser = argparse.ArgumentParser(description="Setup script for Autonomous Security Agent")
     parser.add_argument("--no-venv", action="store_true", help="Skip virtual environment creation")
+    parser.add_argument("--no-cache", action="store_true", help="Don't restore or save a cached virtual environment")
     args = parser.parse_args()
     
     print("=" * 80)
@@ -179,7 +357,7 @@ def main():
     create_gitignore()
     
     if not args.no_venv:
-        venv_dir = setup_environment()
+        venv_dir = setup_environment(use_cache=not args.no_cache)
         create_activation_scripts(venv_dir)
         
         # Remind about model download
@@ -187,7 +365,7 @@ def main():
         if os.path.exists(model_script):
             print("\nDon't forget to download a model:")
             
-            if os.name == 'nt':  # Windows
+            if _IS_WIN:  # Windows
                 print(f"1. Run 'run.bat' to activate the virtual environment")
                 print(f"2. Run 'python {model_script} --list' to see available models")
                 print(f"3. Run 'python {model_script}' to download the default model")
@@ -197,9 +375,9 @@ def main():
                 print(f"3. Run 'python {model_script}' to download the default model")
     else:
         print("Installing dependencies to global Python...")
-        subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"], check=True)
+        install_requirements(sys.executable)
         print("Installing Playwright browsers...")
-        subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"], check=True)
+        run_command([sys.executable, "-m", "playwright", "install", "chromium"])
         
         # Remind about model download
         print("\nDon't forget to download a model:")
@@ -4,27 +4,61 @@ import sys
 import argparse
 import yaml
 
+# Use the libyaml-backed loader and dumper when PyYAML was built with them
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+CONFIG_PATH = "config/settings.yaml"
+
+# Any complete 7-8B GGUF is several GB; smaller files are interrupted downloads
+MIN_MODEL_SIZE = 1_000_000_000
+
 def check_model():
     """Check if the model exists and update config"""
     models_dir = "models"
     model_file = "Meta-Llama-3-8B.Q4_K_M.gguf"  # or "Meta-Llama-3-8B-Instruct.Q4_K_M.gguf"
     model_path = os.path.join(models_dir, model_file)
     
-    if os.path.exists(model_path):
+    if os.path.exists(model_path) and os.path.getsize(model_path) >= MIN_MODEL_SIZE:
         print(f"✅ Model found at {model_path}")
-        update_config(model_path)
+        if config_has_model_path(model_path):
+            print(f"✅ Config file already uses model path: {model_path}")
+        else:
+            update_config(model_path)
         return True
+    
+    if os.path.exists(model_path):
+        print(f"❌ Model at {model_path} is incomplete!")
     else:
         print("❌ Model not found!")
-        print("\nTo download the model, run:")
-        print(f"huggingface-cli download QuantFactory/Meta-Llama-3-8B-GGUF --include \"{model_file}\" --local-dir ./models")
-        print("\nOr download manually from:")
-        print("https://huggingface.co/QuantFactory/Meta-Llama-3-8B-GGUF")
+    print("\nTo download the model, run:")
+    print(f"huggingface-cli download QuantFactory/Meta-Llama-3-8B-GGUF --include \"{model_file}\" --local-dir ./models")
+    print("\nOr download manually from:")
+    print("https://huggingface.co/QuantFactory/Meta-Llama-3-8B-GGUF")
+    return False
+
+def config_has_model_path(model_path):
+    """Check if the config file already points at the model"""
+    try:
+        with open(CONFIG_PATH, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return False
+    
+    # Only parse the YAML when the path appears in it at all
+    if model_path.encode() not in raw:
+        return False
+    
+    try:
+        return yaml.load(raw, Loader=SafeLoader)['llm']['model_path'] == model_path
+    except (yaml.YAMLError, KeyError, TypeError):
         return False
 
 def update_config(model_path):
     """Update the configuration file with the model path"""
-    config_path = "config/settings.yaml"
+    config_path = CONFIG_PATH
     os.makedirs("config", exist_ok=True)
     
     default_config = {
@@ -37,7 +71,13 @@ def update_config(model_path):
             "model_path": model_path,
             "context_window": 4096,
             "temperature": 0.1,
-            "max_tokens": 1024
+            "max_tokens": 1024,
+            "n_gpu_layers": -1,
+            "n_threads": None,
+            "n_threads_batch": None,
+            "n_batch": 512,
+            "use_mmap": True,
+            "use_mlock": False
         },
         "security": {
             "zap_path": "",
@@ -49,7 +89,7 @@ def update_config(model_path):
     if os.path.exists(config_path):
         try:
             with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
+                config = yaml.load(f, Loader=SafeLoader)
             config['llm']['model_path'] = model_path
         except Exception as e:
             print(f"Error reading config file: {e}")
@@ -59,7 +99,7 @@ def update_config(model_path):
     
     try:
         with open(config_path, 'w') as f:
-            yaml.dump(config, f, default_flow_style=False)
+            yaml.dump(config, f, Dumper=SafeDumper, default_flow_style=False)
         print(f"✅ Updated config file with model path: {model_path}")
     except Exception as e:
         print(f"❌ Error updating config file: {e}")
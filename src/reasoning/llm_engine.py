@@ -1,54 +1,173 @@
 # src/reasoning/llm_engine.py
 import os
 import sys
-from llama_cpp import Llama
+import time
+import asyncio
+import functools
+import threading
+from llama_cpp import Llama, StoppingCriteriaList
+
+# System prompt for security analysis
+SYSTEM_PROMPT = """You are an expert security analyst specializing in web application security. 
+Your task is to identify security vulnerabilities, explain why they are issues, 
+and provide clear recommendations to fix them."""
+
+# Fixed start of every formatted prompt, identical across calls
+SYSTEM_PREAMBLE = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+{SYSTEM_PROMPT}
+<|eot_id|>"""
+
+def prefetch_file(path):
+    """Ask the kernel to start reading a file into the page cache"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    
+    try:
+        # WILLNEED starts asynchronous readahead of the whole file
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+@functools.lru_cache(maxsize=4)
+def load_model(model_path, context_window, n_gpu_layers, n_threads, n_threads_batch, n_batch,
+               use_mmap, use_mlock):
+    """Load a model once and share it between engines with the same settings
+    
+    Returns:
+        A (Llama, Lock, preamble tokens) tuple; the lock serializes generation
+        on the shared model
+    """
+    # llama.cpp maps the weights lazily; prefetching them keeps the first
+    # generation from stalling on page faults
+    prefetch_file(model_path)
+    
+    model = Llama(
+        model_path=model_path,
+        n_ctx=context_window,
+        n_gpu_layers=n_gpu_layers,
+        n_threads=n_threads,
+        # os.cpu_count() counts SMT siblings, which can slow prompt evaluation,
+        # so None keeps llama.cpp's default unless a setting overrides it
+        n_threads_batch=n_threads_batch,
+        n_batch=n_batch,
+        use_mmap=use_mmap,
+        use_mlock=use_mlock,
+        verbose=False
+    )
+    
+    # Evaluate the preamble up front; llama.cpp reuses a matching KV-cache
+    # prefix, so no call (including the first) has to evaluate it again
+    preamble_tokens = model.tokenize(SYSTEM_PREAMBLE.encode("utf-8"), special=True)
+    model.eval(preamble_tokens)
+    
+    return model, threading.Lock(), preamble_tokens
 
 class LLMEngine:
     """LLM Reasoning Engine using llama-cpp-python"""
     
-    def __init__(self, model_path, context_window=4096, temperature=0.1, max_tokens=1024):
-        """Initialize the LLM engine with the specified model"""
+    def __init__(self, model_path, context_window=4096, temperature=0.1, max_tokens=1024,
+                 n_gpu_layers=-1, n_threads=None, n_threads_batch=None, n_batch=512,
+                 use_mmap=True, use_mlock=False):
+        """Initialize the LLM engine with the specified model
+        
+        Args:
+            n_gpu_layers: Layers to offload to the GPU (-1 for all), ignored on CPU-only builds
+            n_threads: Threads used for generation, None lets llama.cpp pick (physical cores)
+            n_threads_batch: Threads used for prompt evaluation, None keeps llama.cpp's default
+            n_batch: Prompt tokens evaluated per batch
+            use_mmap: Map the model file instead of reading it into memory
+            use_mlock: Lock the weights in RAM so they are never swapped out
+        """
         self.model_path = model_path
         self.context_window = context_window
         self.temperature = temperature
         self.max_tokens = max_tokens
         
-        # Initialize the model
-        self.model = Llama(
-            model_path=model_path,
-            n_ctx=context_window,
-            verbose=False
+        # Initialize the model, reusing one already loaded with the same settings
+        self.model, self._lock, self._preamble_tokens = load_model(
+            model_path, context_window, n_gpu_layers, n_threads, n_threads_batch, n_batch,
+            use_mmap, use_mlock
         )
     
-    def generate(self, prompt, temperature=None, max_tokens=None):
-        """Generate a response for the given prompt"""
+    def generate(self, prompt, temperature=None, max_tokens=None, timeout=None):
+        """Generate a response for the given prompt
+        
+        If timeout is given, generation stops once it has run that many seconds
+        and TimeoutError is raised.
+        """
+        return self.generate_timed(prompt, temperature, max_tokens, timeout)[0]
+    
+    def generate_timed(self, prompt, temperature=None, max_tokens=None, timeout=None):
+        """Generate a response and measure how long generation took
+        
+        The time is counted from when this call gets the model, so time spent
+        waiting for another call to finish is excluded, and so is the timeout.
+        
+        Returns:
+            Tuple of the generated text and the generation time in seconds
+        """
         if temperature is None:
             temperature = self.temperature
         if max_tokens is None:
             max_tokens = self.max_tokens
-            
-        # Create a system prompt for security analysis
-        system_prompt = """You are an expert security analyst specializing in web application security. 
-Your task is to identify security vulnerabilities, explain why they are issues, 
-and provide clear recommendations to fix them."""
         
-        # Format the prompt for instruction-tuned models
-        formatted_prompt = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
-{system_prompt}
-<|eot_id|><|start_header_id|>user<|end_header_id|>
+        # Format the prompt for instruction-tuned models; only the user turn
+        # needs tokenizing since the preamble tokens are cached
+        user_turn = f"""<|start_header_id|>user<|end_header_id|>
 {prompt.strip()}
 <|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
-        
-        # Generate the response
-        response = self.model(
-            formatted_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stop=["<|eot_id|>"]
+        prompt_tokens = self._preamble_tokens + self.model.tokenize(
+            user_turn.encode("utf-8"), add_bos=False, special=True
         )
         
+        # Generate the response; the model may be shared with other engines
+        with self._lock:
+            start_time = time.perf_counter()
+            stopping_criteria = None
+            if timeout is not None:
+                # Checked after every token, so an overrunning generation frees
+                # the model instead of running on in the background
+                deadline = start_time + timeout
+                stopping_criteria = StoppingCriteriaList([
+                    lambda input_ids, logits: time.perf_counter() >= deadline
+                ])
+            
+            response = self.model(
+                prompt_tokens,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stop=["<|eot_id|>"],
+                stopping_criteria=stopping_criteria
+            )
+            elapsed_time = time.perf_counter() - start_time
+        
+        if timeout is not None and elapsed_time >= timeout:
+            raise TimeoutError(f"Generation stopped after {timeout} seconds")
+        
         # Extract the generated text
-        return response["choices"][0]["text"]
+        return response["choices"][0]["text"], elapsed_time
+    
+    async def generate_async(self, prompt, temperature=None, max_tokens=None, executor=None, timeout=None):
+        """Generate a response in a worker thread without blocking the event loop
+        
+        The thread comes from executor if given, otherwise from the event loop's
+        default executor.
+        
+        Returns:
+            Tuple of the generated text and the generation time in seconds,
+            as returned by generate_timed
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(self.generate_timed, prompt, temperature, max_tokens, timeout)
+        )
     
     def analyze_security(self, page_context):
         """Analyze a web page for security vulnerabilities"""
@@ -1,3 +1,5 @@
+import re
+
 class MockLLMEngine:
     """Mock LLM Engine for testing without an actual LLM"""
     
@@ -59,6 +61,18 @@ Fix: Use textContent instead, or sanitize input: document.getElementById('welcom
             }
         ]
         
+        # Compile the patterns once instead of on every generate call
+        for pattern in self.response_patterns:
+            pattern["compiled"] = re.compile(pattern["pattern"], re.DOTALL)
+        
+        # All patterns as one alternation, so code matching none of them is
+        # rejected in a single scan
+        self._combined_re = re.compile(
+            "|".join(f"(?P<p{i}>{p['pattern']})" for i, p in enumerate(self.response_patterns)),
+            re.DOTALL
+        )
+        self._html_re = re.compile(r"```html\s+(.*?)\s+```", re.DOTALL)
+        
         # Default response for code with no identified vulnerabilities
         self.default_response = "NO_VULNERABILITIES_FOUND"
     
@@ -71,18 +85,35 @@ Fix: Use textContent instead, or sanitize input: document.getElementById('welcom
         Returns:
             A string response
         """
-        # Extract HTML code from the prompt
-        import re
-        html_match = re.search(r"```html\s+(.*?)\s+```", prompt, re.DOTALL)
-        if not html_match:
-            return "NO_VULNERABILITIES_FOUND"
+        # Extract HTML code from the prompt, slicing out the common fenced form
+        # directly and only falling back to the regex for unusual fences
+        html_code = None
+        start = prompt.find("```html")
         
-        html_code = html_match.group(1)
+        if start >= 0 and prompt[start + 7:start + 8].isspace():
+            body = prompt[start + 7:].lstrip()
+            end = body.find("```")
+            if end > 0 and body[end - 1].isspace():
+                html_code = body[:end].rstrip()
         
-        # Check for each response pattern
-        for pattern in self.response_patterns:
-            if re.search(pattern["pattern"], html_code, re.DOTALL):
-                return pattern["response"]
+        if html_code is None:
+            html_match = self._html_re.search(prompt)
+            if not html_match:
+                return "NO_VULNERABILITIES_FOUND"
+            
+            html_code = html_match.group(1)
+        
+        # Find the leftmost match of any response pattern
+        match = self._combined_re.search(html_code)
+        if match:
+            index = int(match.lastgroup[1:])
+            
+            # Earlier patterns take priority even if they match further into the code
+            for pattern in self.response_patterns[:index]:
+                if pattern["compiled"].search(html_code):
+                    return pattern["response"]
+            
+            return self.response_patterns[index]["response"]
         
         # Special case: window.name XSS that pattern matching might miss
         if "window.name" in html_code and "innerHTML" in html_code:
@@ -1,99 +1,271 @@
+import os
 import re
+import time
+import bisect
+import hashlib
 import requests
 import json
+from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
 from src.reasoning.llm_engine import LLMEngine
 
+# Maximum number of characters of HTML scanned by pattern_match
+MAX_SCAN = 1_000_000
+
+# On-disk cache of NVD lookups, reused for up to a day. The project cache root
+# is duplicated from setup.py, which can't import src; keep the two in sync
+CACHE_ROOT = os.environ.get("AUTONOMOUS_SECURITY_AGENT_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "autonomous-security-agent")
+NVD_CACHE_DIR = os.path.join(CACHE_ROOT, "nvd")
+NVD_CACHE_TTL = 24 * 60 * 60
+
+# Vulnerability blocks and their fields in the LLM response
+_BLOCK_RE = re.compile(r"VULNERABILITY (.*?)(?=VULNERABILITY |\Z)", re.DOTALL)
+_FIELD_RE = re.compile(r"^(Type|Subtype|CWE|Code|Line|Description|Fix):[ \t]*(.*)$", re.MULTILINE)
+
+def compile_pattern(regex):
+    """Compile a case-insensitive, dot-all pattern, using RE2 when available
+    
+    RE2 matches in linear time but has no lookarounds, so patterns using them
+    are compiled with re instead.
+    """
+    if re2 is not None and not any(op in regex for op in ("(?=", "(?!", "(?<")):
+        try:
+            return re2.compile("(?is)" + regex)
+        except re2.error:
+            pass
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+def summarize_cve(vuln):
+    """Extract the ID, English description and CVSS severity of an NVD entry
+    
+    Args:
+        vuln: One item of the "vulnerabilities" list of an NVD response
+        
+    Returns:
+        Dictionary with the id, description, severity and score
+    """
+    cve = vuln.get("cve", {})
+    
+    # Get description
+    description = ""
+    for desc in cve.get("descriptions", []):
+        if desc.get("lang") == "en":
+            description = desc.get("value", "")
+            break
+    
+    # Get severity
+    metrics = cve.get("metrics", {})
+    severity = "Unknown"
+    score = 0.0
+    
+    if "cvssMetricV31" in metrics:
+        cvss = metrics["cvssMetricV31"][0]
+        severity = cvss.get("cvssData", {}).get("baseSeverity", "Unknown")
+        score = cvss.get("cvssData", {}).get("baseScore", 0.0)
+    elif "cvssMetricV30" in metrics:
+        cvss = metrics["cvssMetricV30"][0]
+        severity = cvss.get("cvssData", {}).get("baseSeverity", "Unknown")
+        score = cvss.get("cvssData", {}).get("baseScore", 0.0)
+    elif "cvssMetricV2" in metrics:
+        cvss = metrics["cvssMetricV2"][0]
+        severity = cvss.get("baseSeverity", "Unknown")
+        score = cvss.get("cvssData", {}).get("baseScore", 0.0)
+    
+    return {
+        "id": cve.get("id", ""),
+        "description": description,
+        "severity": severity,
+        "score": score
+    }
+
+# Vulnerability pattern databases, compiled once at import. Each "anchor" is
+# a lowercase literal that any match of the pattern must contain
+
+# XSS patterns
+XSS_PATTERNS = [
+    {
+        "regex": r"<script>.*document\.write\s*\(.*location.*\)",
+        "anchor": "document.write",
+        "cwe": "79",
+        "type": "XSS",
+        "subtype": "DOM-based XSS",
+        "description": "DOM-based XSS using document.write with location"
+    },
+    {
+        "regex": r"<script>.*document\.write\s*\(.*localStorage.*\)",
+        "anchor": "localstorage",
+        "cwe": "79",
+        "type": "XSS",
+        "subtype": "DOM-based XSS",
+        "description": "DOM-based XSS using document.write with localStorage"
+    },
+    {
+        "regex": r"<script>.*innerHTML\s*=.*location.*",
+        "anchor": "innerhtml",
+        "cwe": "79",
+        "type": "XSS",
+        "subtype": "DOM-based XSS",
+        "description": "DOM-based XSS setting innerHTML from location"
+    },
+    {
+        "regex": r"<input[^>]*value\s*=\s*[\"']?\s*<\?php\s+echo\s+\$_(GET|POST|REQUEST)",
+        "anchor": "<?php",
+        "cwe": "79",
+        "type": "XSS",
+        "subtype": "Reflected XSS",
+        "description": "Reflected XSS via PHP echo of user input"
+    }
+]
+
+# CSRF patterns
+CSRF_PATTERNS = [
+    {
+        # Matches the form tag and captures the form body, up to the closing
+        # or next form tag; the finding is dropped if the body contains the
+        # "absent" marker
+        "regex": r"<form\b[^>]*method\s*=\s*[\"']?\s*POST[\"']?[^>]*>(?=(.*?)(?:</form>|<form\b|\Z))",
+        "anchor": "<form",
+        "absent": "csrf",
+        "cwe": "352",
+        "type": "CSRF",
+        "subtype": "Missing Token",
+        "description": "POST form without CSRF token"
+    }
+]
+
+# Information disclosure patterns
+INFO_DISCLOSURE_PATTERNS = [
+    {
+        "regex": r"<!--.*password.*-->",
+        "anchor": "password",
+        "cwe": "200",
+        "type": "Information Disclosure",
+        "subtype": "Sensitive Comment",
+        "description": "Comment containing password information"
+    },
+    {
+        "regex": r"<!--.*TODO.*-->",
+        "anchor": "todo",
+        "cwe": "200",
+        "type": "Information Disclosure",
+        "subtype": "Developer Comment",
+        "description": "Developer TODO comment in production code"
+    },
+    {
+        "regex": r"<input[^>]*type\s*=\s*[\"']?password[\"']?[^>]*autocomplete\s*=\s*[\"']?on[\"']?",
+        "anchor": "autocomplete",
+        "cwe": "200", 
+        "type": "Information Disclosure",
+        "subtype": "Password Storage",
+        "description": "Password field with autocomplete enabled"
+    }
+]
+
+# Combine all patterns
+ALL_PATTERNS = XSS_PATTERNS + CSRF_PATTERNS + INFO_DISCLOSURE_PATTERNS
+
+for _pattern in ALL_PATTERNS:
+    _pattern["compiled"] = compile_pattern(_pattern["regex"])
+
+# All patterns fused into one alternation, to locate the earliest
+# match of any pattern in a single scan
+COMBINED_PATTERN = compile_pattern("|".join(f"(?:{p['regex']})" for p in ALL_PATTERNS))
+
+def build_hyperscan_db(patterns):
+    """Compile patterns into a Hyperscan database telling which can match at all
+    
+    Lookaheads are not supported by Hyperscan, so the patterns are compiled
+    in prefilter mode and the actual findings still come from re.
+    
+    Returns:
+        The database, or None if Hyperscan is unavailable or compilation fails
+    """
+    if hyperscan is None:
+        return None
+    
+    flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_DOTALL |
+             hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH |
+             hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP)
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[p["regex"].encode() for p in patterns],
+            ids=list(range(len(patterns))),
+            flags=[flags] * len(patterns)
+        )
+        return db
+    except hyperscan.error as e:
+        print(f"❌ Error compiling Hyperscan database, using re: {e}")
+        return None
+
+HS_DB = build_hyperscan_db(ALL_PATTERNS)
+
 class SecurityAnalyzer:
     """Security analyzer using pattern matching and LLM reasoning"""
     
-    def __init__(self, llm_engine=None, api_key=None):
+    def __init__(self, llm_engine=None, api_key=None, nvd_cache_dir=None):
         """Initialize the security analyzer
         
         Args:
             llm_engine: The LLM engine instance for analysis
             api_key: Optional NVD API key for higher rate limits
+            nvd_cache_dir: Directory for cached NVD lookups, defaults to NVD_CACHE_DIR
         """
         self.llm_engine = llm_engine
         self.nvd_api_key = api_key
+        self.nvd_cache_dir = nvd_cache_dir or NVD_CACHE_DIR
         self.nvd_base_url = "https://services.nvd.nist.gov/rest/json/cves/2.0"
         
+        # Shared session so NVD requests reuse connections, retrying on rate
+        # limits and server errors
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3,
+                              status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        
+        # NVD lookups by CWE ID, kept across analyze_html calls
+        self._nvd_cache = {}
+        
         # Initialize pattern databases
         self.initialize_patterns()
     
     def initialize_patterns(self):
         """Initialize vulnerability pattern databases"""
-        # XSS patterns
-        self.xss_patterns = [
-            {
-                "regex": r"<script>.*document\.write\s*\(.*location.*\)",
-                "cwe": "79",
-                "type": "XSS",
-                "subtype": "DOM-based XSS",
-                "description": "DOM-based XSS using document.write with location"
-            },
-            {
-                "regex": r"<script>.*document\.write\s*\(.*localStorage.*\)",
-                "cwe": "79",
-                "type": "XSS",
-                "subtype": "DOM-based XSS",
-                "description": "DOM-based XSS using document.write with localStorage"
-            },
-            {
-                "regex": r"<script>.*innerHTML\s*=.*location.*",
-                "cwe": "79",
-                "type": "XSS",
-                "subtype": "DOM-based XSS",
-                "description": "DOM-based XSS setting innerHTML from location"
-            },
-            {
-                "regex": r"<input[^>]*value\s*=\s*[\"']?\s*<\?php\s+echo\s+\$_(GET|POST|REQUEST)",
-                "cwe": "79",
-                "type": "XSS",
-                "subtype": "Reflected XSS",
-                "description": "Reflected XSS via PHP echo of user input"
-            }
-        ]
-        
-        # CSRF patterns
-        self.csrf_patterns = [
-            {
-                "regex": r"<form[^>]*method\s*=\s*[\"']?\s*POST[\"']?[^>]*>(?!.*csrf)",
-                "cwe": "352",
-                "type": "CSRF",
-                "subtype": "Missing Token",
-                "description": "POST form without CSRF token"
-            }
-        ]
-        
-        # Information disclosure patterns
-        self.info_disclosure_patterns = [
-            {
-                "regex": r"<!--.*password.*-->",
-                "cwe": "200",
-                "type": "Information Disclosure",
-                "subtype": "Sensitive Comment",
-                "description": "Comment containing password information"
-            },
-            {
-                "regex": r"<!--.*TODO.*-->",
-                "cwe": "200",
-                "type": "Information Disclosure",
-                "subtype": "Developer Comment",
-                "description": "Developer TODO comment in production code"
-            },
-            {
-                "regex": r"<input[^>]*type\s*=\s*[\"']?password[\"']?[^>]*autocomplete\s*=\s*[\"']?on[\"']?",
-                "cwe": "200", 
-                "type": "Information Disclosure",
-                "subtype": "Password Storage",
-                "description": "Password field with autocomplete enabled"
-            }
-        ]
-        
-        # Combine all patterns
-        self.all_patterns = self.xss_patterns + self.csrf_patterns + self.info_disclosure_patterns
+        self.xss_patterns = XSS_PATTERNS
+        self.csrf_patterns = CSRF_PATTERNS
+        self.info_disclosure_patterns = INFO_DISCLOSURE_PATTERNS
+        self.all_patterns = ALL_PATTERNS
+        self.combined_pattern = COMBINED_PATTERN
+        
+        # Hyperscan scratch space cannot be shared between concurrent scans,
+        # so each analyzer gets its own
+        self.hs_db = HS_DB
+        if self.hs_db is not None:
+            self.hs_scratch = hyperscan.Scratch(self.hs_db)
     
     def pattern_match(self, html_code):
         """Identify vulnerabilities using pattern matching
@@ -106,16 +278,57 @@ class SecurityAnalyzer:
         """
         findings = []
         
-        # Check all patterns
-        for pattern in self.all_patterns:
-            matches = re.finditer(pattern["regex"], html_code, re.IGNORECASE | re.DOTALL)
+        # Cap the work on very large pages; anything past MAX_SCAN is not scanned
+        if len(html_code) > MAX_SCAN:
+            print(f"Warning: HTML is {len(html_code)} characters, pattern matching only the first {MAX_SCAN}")
+            html_code = html_code[:MAX_SCAN]
+        
+        if self.hs_db is not None:
+            # Only run re for the patterns Hyperscan reports as candidates
+            hits = set()
+            self.hs_db.scan(
+                html_code.encode("utf-8", "replace"),
+                match_event_handler=lambda id, frm, to, flags, ctx: ctx.add(id),
+                context=hits,
+                scratch=self.hs_scratch
+            )
+            if not hits:
+                return findings
+            patterns = [p for i, p in enumerate(self.all_patterns) if i in hits]
+            scan_start = 0
+        else:
+            # No pattern matches before the earliest match of the fused pattern, so
+            # clean code needs only one scan and the rest can start from there
+            first_match = self.combined_pattern.search(html_code)
+            if not first_match:
+                return findings
+            patterns = self.all_patterns
+            scan_start = first_match.start()
+        
+        # Offsets of every newline, so line numbers can be found by bisection
+        nl_positions = [m.start() for m in re.finditer('\n', html_code)]
+        lines = html_code.split('\n')
+        
+        # For ASCII input, lowercasing agrees with the patterns' case-insensitive
+        # matching, so a pattern whose anchor is missing cannot match
+        html_lower = html_code.lower() if html_code.isascii() else None
+        
+        # Check all candidate patterns
+        for pattern in patterns:
+            if html_lower is not None and pattern["anchor"] not in html_lower:
+                continue
+            
+            matches = pattern["compiled"].finditer(html_code, scan_start)
             
             for match in matches:
+                # Skip matches that contain the marker the pattern requires to be absent
+                if "absent" in pattern and pattern["absent"] in match.group(1).lower():
+                    continue
+                
                 # Get line number
-                line_number = html_code[:match.start()].count('\n') + 1
+                line_number = bisect.bisect_right(nl_positions, match.start()) + 1
                 
                 # Get context (a few lines before and after)
-                lines = html_code.split('\n')
                 start_line = max(0, line_number - 3)
                 end_line = min(len(lines), line_number + 3)
                 context_lines = lines[start_line:end_line]
@@ -219,33 +432,17 @@ class SecurityAnalyzer:
         if "NO_VULNERABILITIES_FOUND" in analysis:
             return findings
         
-        vulnerability_sections = analysis.split("VULNERABILITY ")
-        
-        for section in vulnerability_sections[1:]:
-            lines = section.strip().split("\n")
-            if not lines:
-                continue
-                
+        for block in _BLOCK_RE.finditer(analysis):
             vulnerability = {"source": "llm_analysis"}
             
-            for line in lines:
-                if line.startswith("Type:"):
-                    vulnerability["type"] = line.replace("Type:", "").strip()
-                elif line.startswith("Subtype:"):
-                    vulnerability["subtype"] = line.replace("Subtype:", "").strip()
-                elif line.startswith("CWE:"):
-                    vulnerability["cwe"] = line.replace("CWE:", "").strip()
-                elif line.startswith("Code:"):
-                    vulnerability["code"] = line.replace("Code:", "").strip()
-                elif line.startswith("Line:"):
-                    try:
-                        vulnerability["line"] = int(line.replace("Line:", "").strip())
-                    except ValueError:
-                        vulnerability["line"] = line.replace("Line:", "").strip()
-                elif line.startswith("Description:"):
-                    vulnerability["description"] = line.replace("Description:", "").strip()
-                elif line.startswith("Fix:"):
-                    vulnerability["fix"] = line.replace("Fix:", "").strip()
+            for field in _FIELD_RE.finditer(block.group(1).strip()):
+                vulnerability[field.group(1).lower()] = field.group(2).strip()
+            
+            if "line" in vulnerability:
+                try:
+                    vulnerability["line"] = int(vulnerability["line"])
+                except ValueError:
+                    pass
             
             if "type" in vulnerability and "description" in vulnerability:
                 findings.append(vulnerability)
@@ -261,6 +458,22 @@ class SecurityAnalyzer:
         Returns:
             Dictionary with NVD information
         """
+        if cwe_id in self._nvd_cache:
+            return self._nvd_cache[cwe_id]
+        
+        cache_key = hashlib.sha256(f"v1:{cwe_id}".encode()).hexdigest()
+        cache_path = os.path.join(self.nvd_cache_dir, f"{cache_key}.json")
+        
+        # Reuse a recent lookup from a previous run
+        try:
+            if time.time() - os.path.getmtime(cache_path) < NVD_CACHE_TTL:
+                with open(cache_path, "r") as f:
+                    nvd_info = json.load(f)
+                self._nvd_cache[cwe_id] = nvd_info
+                return nvd_info
+        except (OSError, ValueError):
+            pass
+        
         try:
             # Build request parameters
             params = {
@@ -272,59 +485,121 @@ class SecurityAnalyzer:
                 params["apiKey"] = self.nvd_api_key
             
             # Make the request
-            response = requests.get(self.nvd_base_url, params=params)
+            response = self.session.get(self.nvd_base_url, params=params, timeout=(3, 10))
             response.raise_for_status()
             
             # Parse the response
             data = response.json()
             
             # Extract relevant information
-            vulnerabilities = []
-            if "vulnerabilities" in data:
-                for vuln in data["vulnerabilities"]:
-                    cve = vuln.get("cve", {})
-                    
-                    # Get description
-                    description = ""
-                    for desc in cve.get("descriptions", []):
-                        if desc.get("lang") == "en":
-                            description = desc.get("value", "")
-                            break
-                    
-                    # Get severity
-                    metrics = cve.get("metrics", {})
-                    severity = "Unknown"
-                    score = 0.0
-                    
-                    if "cvssMetricV31" in metrics:
-                        cvss = metrics["cvssMetricV31"][0]
-                        severity = cvss.get("cvssData", {}).get("baseSeverity", "Unknown")
-                        score = cvss.get("cvssData", {}).get("baseScore", 0.0)
-                    elif "cvssMetricV30" in metrics:
-                        cvss = metrics["cvssMetricV30"][0]
-                        severity = cvss.get("cvssData", {}).get("baseSeverity", "Unknown")
-                        score = cvss.get("cvssData", {}).get("baseScore", 0.0)
-                    elif "cvssMetricV2" in metrics:
-                        cvss = metrics["cvssMetricV2"][0]
-                        severity = cvss.get("baseSeverity", "Unknown")
-                        score = cvss.get("cvssData", {}).get("baseScore", 0.0)
-                    
-                    vulnerabilities.append({
-                        "id": cve.get("id", ""),
-                        "description": description,
-                        "severity": severity,
-                        "score": score
-                    })
+            vulnerabilities = [summarize_cve(vuln) for vuln in data.get("vulnerabilities", [])]
             
-            return {
+            # Only successful lookups are cached, so failures are retried next time
+            nvd_info = {
                 "cwe_id": cwe_id,
                 "examples": vulnerabilities
             }
+            self._nvd_cache[cwe_id] = nvd_info
+            
+            # Write the cache file atomically so readers never see a partial file
+            try:
+                os.makedirs(self.nvd_cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(nvd_info, f)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"Warning: Could not write NVD cache: {e}")
+            
+            return nvd_info
             
         except Exception as e:
             print(f"Error fetching NVD information: {e}")
             return {"cwe_id": cwe_id, "error": str(e), "examples": []}
     
+    def _chunked_llm(self, html_code):
+        """Analyze large HTML with the LLM section by section
+        
+        Args:
+            html_code: The HTML code to analyze
+            
+        Returns:
+            A list of vulnerabilities found by the LLM, tagged with their chunk
+        """
+        llm_findings = []
+        
+        # For larger HTML, analyze key sections
+        print("HTML too large for full LLM analysis, analyzing key sections...")
+        
+        # Basic chunking approach
+        chunks = []
+        
+        try:
+            if etree is not None:
+                # Stream the document and keep only forms and scripts, rather
+                # than building a full tree
+                forms = []
+                scripts = []
+                events = etree.iterparse(
+                    BytesIO(html_code.encode('utf-8', 'replace')),
+                    events=('end',),
+                    tag=('form', 'script'),
+                    html=True,
+                    encoding='utf-8'
+                )
+                for _, elem in events:
+                    chunk = etree.tostring(elem, encoding='unicode', method='html', with_tail=False)
+                    if elem.tag == 'form':
+                        forms.append(chunk)
+                        elem.clear()
+                    else:
+                        scripts.append(chunk)
+                        # A script inside a form is still part of the form's chunk
+                        if next(elem.iterancestors('form'), None) is None:
+                            elem.clear()
+                
+                # Forms (high-value targets) first, then scripts
+                chunks.extend(forms)
+                chunks.extend(scripts)
+            else:
+                # Without lxml, fall back to the stdlib parser
+                soup = BeautifulSoup(html_code, 'html.parser')
+                
+                # Extract forms (high-value targets)
+                forms = soup.find_all('form')
+                for form in forms:
+                    chunks.append(str(form))
+                
+                # Extract scripts (high-value targets)
+                scripts = soup.find_all('script')
+                for script in scripts:
+                    chunks.append(str(script))
+            
+        except Exception as e:
+            print(f"Error parsing HTML: {e}")
+            # Fallback to simple chunking if parsing fails
+            chunk_size = 4000
+            for i in range(0, len(html_code), chunk_size):
+                chunks.append(html_code[i:i+chunk_size])
+        
+        # Analyze the chunks concurrently, keeping results in chunk order
+        def analyze_chunk(i, chunk):
+            print(f"Analyzing chunk {i}/{len(chunks)}...")
+            return self.llm_analyze(chunk)
+        
+        if not chunks:
+            return llm_findings
+        
+        with ThreadPoolExecutor(max_workers=min(8, len(chunks))) as executor:
+            results = list(executor.map(analyze_chunk, range(1, len(chunks) + 1), chunks))
+        
+        for i, chunk_findings in enumerate(results):
+            for finding in chunk_findings:
+                finding["chunk"] = i+1
+            llm_findings.extend(chunk_findings)
+        
+        return llm_findings
+    
     def analyze_html(self, html_code):
         """Analyze HTML code for security vulnerabilities
         
@@ -335,100 +610,70 @@ class SecurityAnalyzer:
             A dictionary with analysis results
         """
         # Track execution time
-        import time
         start_time = time.time()
         
-        # Find vulnerabilities using pattern matching
-        pattern_findings = self.pattern_match(html_code)
-        pattern_time = time.time() - start_time
-        
-        # Find vulnerabilities using LLM
-        llm_start_time = time.time()
+        # Run the LLM analysis in the background while pattern matching runs
         llm_findings = []
-        
-        if self.llm_engine:
-            # For smaller HTML, analyze the whole thing
-            if len(html_code) < 5000:
-                llm_findings = self.llm_analyze(html_code)
-            else:
-                # For larger HTML, analyze key sections
-                print("HTML too large for full LLM analysis, analyzing key sections...")
-                
-                # Basic chunking approach
-                chunks = []
-                
-                # Try to parse with BeautifulSoup
-                try:
-                    soup = BeautifulSoup(html_code, 'html.parser')
-                    
-                    # Extract forms (high-value targets)
-                    forms = soup.find_all('form')
-                    for form in forms:
-                        chunks.append(str(form))
-                    
-                    # Extract scripts (high-value targets)
-                    scripts = soup.find_all('script')
-                    for script in scripts:
-                        chunks.append(str(script))
-                    
-                except Exception as e:
-                    print(f"Error parsing HTML: {e}")
-                    # Fallback to simple chunking if parsing fails
-                    chunk_size = 4000
-                    for i in range(0, len(html_code), chunk_size):
-                        chunks.append(html_code[i:i+chunk_size])
-                
-                # Analyze each chunk
-                for i, chunk in enumerate(chunks):
-                    print(f"Analyzing chunk {i+1}/{len(chunks)}...")
-                    chunk_findings = self.llm_analyze(chunk)
-                    for finding in chunk_findings:
-                        finding["chunk"] = i+1
-                    llm_findings.extend(chunk_findings)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            llm_start_time = time.time()
+            llm_future = None
+            if self.llm_engine:
+                # For smaller HTML, analyze the whole thing
+                if len(html_code) < 5000:
+                    llm_future = executor.submit(self.llm_analyze, html_code)
+                else:
+                    llm_future = executor.submit(self._chunked_llm, html_code)
+            
+            # Find vulnerabilities using pattern matching
+            pattern_findings = self.pattern_match(html_code)
+            pattern_time = time.time() - start_time
+            
+            if llm_future:
+                llm_findings = llm_future.result()
         
         llm_time = time.time() - llm_start_time
         
         # Merge findings and remove duplicates
         merged_findings = []
         
+        # First finding seen for each (type, code) pair
+        index = {}
+        
         # Add pattern findings
         for finding in pattern_findings:
             merged_findings.append(finding)
+            index.setdefault((finding.get("type"), finding.get("code")), finding)
         
         # Add LLM findings, avoiding duplicates
         for llm_finding in llm_findings:
-            # Check if this is a duplicate
-            is_duplicate = False
-            for existing in merged_findings:
-                # Compare type and code
-                if (existing.get("type") == llm_finding.get("type") and 
-                    existing.get("code") == llm_finding.get("code")):
-                    is_duplicate = True
-                    
-                    # Add LLM description to pattern finding if not present
-                    if existing.get("source") == "pattern_match" and "fix" in llm_finding:
-                        existing["fix"] = llm_finding["fix"]
-                    
-                    break
+            # Compare type and code
+            key = (llm_finding.get("type"), llm_finding.get("code"))
+            existing = index.get(key)
             
-            if not is_duplicate:
+            if existing is not None:
+                # Add LLM description to pattern finding if not present
+                if existing.get("source") == "pattern_match" and "fix" in llm_finding:
+                    existing["fix"] = llm_finding["fix"]
+            else:
                 merged_findings.append(llm_finding)
+                index[key] = llm_finding
         
         # Enrich with NVD data
         nvd_start_time = time.time()
+        # Look up each unique CWE once, with the HTTP requests running in parallel
+        unique_cwes = list(dict.fromkeys(
+            finding["cwe"] for finding in merged_findings
+            if "cwe" in finding and finding["cwe"].isdigit()
+        ))
+        cwe_to_info = {}
+        if unique_cwes:
+            with ThreadPoolExecutor(max_workers=min(8, len(unique_cwes))) as executor:
+                cwe_to_info = dict(zip(unique_cwes, executor.map(self.get_nvd_info, unique_cwes)))
+        
         for finding in merged_findings:
-            # Only look up if we have a CWE ID
-            if "cwe" in finding and finding["cwe"].isdigit():
-                cwe_id = finding["cwe"]
-                
-                # Check if we've already looked up this CWE
-                nvd_info = next((f.get("nvd_info") for f in merged_findings 
-                                 if "nvd_info" in f and f.get("cwe") == cwe_id), None)
-                
-                if not nvd_info:
-                    nvd_info = self.get_nvd_info(cwe_id)
-                
-                finding["nvd_info"] = nvd_info
+            # Only attach if we have a CWE ID
+            if finding.get("cwe") in cwe_to_info:
+                finding["nvd_info"] = cwe_to_info[finding["cwe"]]
         
         nvd_time = time.time() - nvd_start_time
         
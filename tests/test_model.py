@@ -1,15 +1,47 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import time
 import yaml
+import asyncio
+import csv
+import atexit
+import argparse
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+# Use the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Faster JSON serialization when orjson is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Parquet summaries when pyarrow is installed, CSV otherwise
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+# Optional Aho-Corasick automaton for matching all topics in one pass
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # Add the project root to the path so we can import modules correctly
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-sys.path.append(project_root)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
 
 # Import your LLM engine class - adjust this path based on your actual implementation
 try:
@@ -20,11 +52,23 @@ except ImportError:
     sys.exit(1)
 
 # Configuration
-CONFIG_PATH = os.path.join(project_root, "config/settings.yaml")
-OUTPUT_DIR = os.path.join(project_root, "tests/results")
+CONFIG_PATH = PROJECT_ROOT / "config" / "settings.yaml"
+OUTPUT_DIR = PROJECT_ROOT / "tests" / "results"
+# Successful scenario results of an interrupted run, reused by the next run
+CHECKPOINT_PATH = OUTPUT_DIR / "checkpoint.json"
 TIMEOUT = 120  # Maximum time for each test in seconds
+# Scenarios generating at once. A local model serialises generation, so
+# only raise this for engines that serve requests concurrently
+MAX_IN_FLIGHT = 1
 
-# Test scenarios
+# Worker threads for generation, shared by all scenarios and shut down at exit
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+atexit.register(_EXECUTOR.shutdown, wait=True)
+
+# Settings from the llm config section that are forwarded to LLMEngine
+ENGINE_OPTIONS = ["context_window", "n_gpu_layers", "n_threads", "n_threads_batch", "n_batch", "use_mmap", "use_mlock"]
+
+# Test scenarios; max_tokens bounds the length of each answer
 TEST_SCENARIOS = [
     {
         "name": "XSS Vulnerability Detection",
@@ -44,7 +88,8 @@ TEST_SCENARIOS = [
         
         Identify all XSS vulnerabilities, explain why they are vulnerabilities, and suggest fixes.
         """,
-        "expected_topics": ["reflected XSS", "DOM-based XSS", "user input sanitization"]
+        "expected_topics": ["reflected XSS", "DOM-based XSS", "user input sanitization"],
+        "max_tokens": 1024
     },
     {
         "name": "SQL Injection Detection",
@@ -70,7 +115,8 @@ TEST_SCENARIOS = [
         
         Identify any SQL injection vulnerabilities, explain the risks, and provide a secure implementation.
         """,
-        "expected_topics": ["SQL injection", "parameterized queries", "prepared statements", "input validation"]
+        "expected_topics": ["SQL injection", "parameterized queries", "prepared statements", "input validation"],
+        "max_tokens": 1024
     },
     {
         "name": "CSRF Vulnerability Analysis",
@@ -87,7 +133,8 @@ TEST_SCENARIOS = [
         
         Identify if there are any CSRF vulnerabilities, explain the risks, and provide recommendations to fix them.
         """,
-        "expected_topics": ["CSRF token", "origin validation", "SameSite cookies"]
+        "expected_topics": ["CSRF token", "origin validation", "SameSite cookies"],
+        "max_tokens": 768
     },
     {
         "name": "Security Header Analysis",
@@ -105,7 +152,8 @@ TEST_SCENARIOS = [
         
         Identify missing security headers and explain which headers should be added and why.
         """,
-        "expected_topics": ["Content-Security-Policy", "X-Frame-Options", "X-XSS-Protection", "Strict-Transport-Security"]
+        "expected_topics": ["Content-Security-Policy", "X-Frame-Options", "X-XSS-Protection", "Strict-Transport-Security"],
+        "max_tokens": 512
     },
     {
         "name": "API Security Analysis",
@@ -134,7 +182,8 @@ TEST_SCENARIOS = [
         
         Identify any security issues and provide recommendations for a more secure implementation.
         """,
-        "expected_topics": ["authorization", "excessive data exposure", "sensitive data", "access control"]
+        "expected_topics": ["authorization", "excessive data exposure", "sensitive data", "access control"],
+        "max_tokens": 768
     },
     {
         "name": "Website Vulnerability Analysis",
@@ -151,7 +200,8 @@ TEST_SCENARIOS = [
         Based on this information, what potential security vulnerabilities should I look for?
         Provide a comprehensive analysis of possible security issues and how I might test for them.
         """,
-        "expected_topics": ["brute force protection", "account lockout", "password policies", "HTTPS validation"]
+        "expected_topics": ["brute force protection", "account lockout", "password policies", "HTTPS validation"],
+        "max_tokens": 1536
     },
     {
         "name": "Security Recommendation Generation",
@@ -166,61 +216,124 @@ TEST_SCENARIOS = [
         
         Generate a comprehensive security recommendation report with specific, actionable items to improve the website's security.
         """,
-        "expected_topics": ["WordPress updates", "plugin vulnerabilities", "payment security", "PCI compliance"]
+        "expected_topics": ["WordPress updates", "plugin vulnerabilities", "payment security", "PCI compliance"],
+        "max_tokens": 2048
     }
 ]
 
+# Hash each prompt once for the checkpoint and results file. Lowercase the
+# expected topics once for the case-insensitive coverage check, and build an
+# automaton over them when pyahocorasick is installed
+for _scenario in TEST_SCENARIOS:
+    _scenario['_hash'] = hashlib.blake2b(_scenario['prompt'].encode("utf-8"), digest_size=16).hexdigest()
+    _scenario['_expected_lower'] = [t.lower() for t in _scenario['expected_topics']]
+    _scenario['_automaton'] = None
+    if ahocorasick is not None:
+        _automaton = ahocorasick.Automaton()
+        for _topic_lower in _scenario['_expected_lower']:
+            _automaton.add_word(_topic_lower, _topic_lower)
+        _automaton.make_automaton()
+        _scenario['_automaton'] = _automaton
+
+# Every expected topic in one pattern, longest first so a topic that starts
+# with a shorter one wins at the same position. The lookahead reports a
+# match at every position instead of skipping past overlapping topics
+_ALL_TOPICS = sorted({t for s in TEST_SCENARIOS for t in s['_expected_lower']}, key=len, reverse=True)
+TOPICS_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, _ALL_TOPICS)) + "))")
+
+def find_topics(scenario, response):
+    """Return the expected topics of a scenario that appear in the response"""
+    response_lower = response.lower()
+    if scenario['_automaton'] is not None:
+        # One pass over the response for all topics
+        matched = {topic_lower for _, topic_lower in scenario['_automaton'].iter(response_lower)}
+    else:
+        # One regex pass over the response; a topic occurs wherever it is a
+        # prefix of the longest topic found at that position
+        hits = set(TOPICS_PATTERN.findall(response_lower))
+        matched = {topic_lower for topic_lower in scenario['_expected_lower']
+                   if any(hit.startswith(topic_lower) for hit in hits)}
+    return [topic for topic, topic_lower in zip(scenario['expected_topics'], scenario['_expected_lower'])
+            if topic_lower in matched]
+
 def load_config():
     """Load configuration from the config file"""
     try:
         with open(CONFIG_PATH, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=SafeLoader)
         return config
     except Exception as e:
         print(f"Error loading config: {e}")
         return None
 
-def init_llm_engine(model_path):
+def engine_settings(llm_config=None):
+    """Build the LLMEngine keyword arguments other than the model path"""
+    settings = {
+        "temperature": 0.1,  # Lower temperature for more focused, deterministic responses
+        "max_tokens": 2048
+    }
+    
+    # Pass through the performance settings from the llm section of the config
+    llm_config = llm_config or {}
+    settings.update({key: llm_config[key] for key in ENGINE_OPTIONS if key in llm_config})
+    return settings
+
+def init_llm_engine(model_path, llm_config=None):
     """Initialize the LLM engine with the specified model"""
     try:
         # You might need to adjust these parameters based on your LLMEngine implementation
         engine = LLMEngine(
             model_path=model_path,
-            temperature=0.1,  # Lower temperature for more focused, deterministic responses
-            max_tokens=2048
+            **engine_settings(llm_config)
         )
         return engine
     except Exception as e:
         print(f"Error initializing LLM engine: {e}")
         return None
 
-def run_test(engine, scenario, index):
+async def run_test(engine, scenario, index, semaphore, checkpoint=None):
+    """Run a single test scenario once a slot is free"""
+    # Reuse the result from an earlier run of the same prompt and settings,
+    # marked so it is not mistaken for a fresh measurement
+    if checkpoint and scenario['name'] in checkpoint:
+        print(f"\n[{index+1}/{len(TEST_SCENARIOS)}] Skipping: {scenario['name']} (completed in an earlier run)")
+        return dict(checkpoint[scenario['name']]['result'], resumed=True)
+    
+    async with semaphore:
+        return await _run_scenario(engine, scenario, index)
+
+async def _run_scenario(engine, scenario, index):
     """Run a single test scenario"""
     print(f"\n[{index+1}/{len(TEST_SCENARIOS)}] Testing: {scenario['name']}")
     print("-" * 80)
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
-        # Set a timeout for the test
-        response = engine.generate(scenario['prompt'])
-        elapsed_time = time.time() - start_time
+        # Set a timeout for the test. The engine enforces it and stops generating,
+        # and times the generation itself, excluding any wait for the model
+        response, elapsed_time = await engine.generate_async(
+            scenario['prompt'],
+            max_tokens=scenario.get('max_tokens'),
+            executor=_EXECUTOR,
+            timeout=TIMEOUT
+        )
         
         # Check if expected topics are present in the response
-        topics_found = []
-        for topic in scenario['expected_topics']:
-            if topic.lower() in response.lower():
-                topics_found.append(topic)
+        topics_found = find_topics(scenario, response)
+        found_set = set(topics_found)
         
         coverage = len(topics_found) / len(scenario['expected_topics']) * 100
         
         result = {
             "name": scenario['name'],
+            "prompt_hash": scenario['_hash'],
             "success": True,
             "response": response,
             "elapsed_time": elapsed_time,
             "topics_found": topics_found,
             "topics_coverage": f"{coverage:.1f}%",
-            "topics_missing": [t for t in scenario['expected_topics'] if t not in topics_found]
+            "topics_coverage_pct": coverage,
+            "topics_missing": [t for t in scenario['expected_topics'] if t not in found_set]
         }
         
         print(f"✅ Test completed in {elapsed_time:.2f} seconds")
@@ -228,31 +341,145 @@ def run_test(engine, scenario, index):
         if result['topics_missing']:
             print(f"Missing topics: {', '.join(result['topics_missing'])}")
         
+    except TimeoutError:
+        result = {
+            "name": scenario['name'],
+            "prompt_hash": scenario['_hash'],
+            "success": False,
+            "timed_out": True,
+            "error": f"Timed out after {TIMEOUT} seconds",
+            "elapsed_time": time.perf_counter() - start_time
+        }
+        print(f"❌ Test timed out after {TIMEOUT} seconds")
+    
     except Exception as e:
         result = {
             "name": scenario['name'],
+            "prompt_hash": scenario['_hash'],
             "success": False,
             "error": str(e),
-            "elapsed_time": time.time() - start_time
+            "elapsed_time": time.perf_counter() - start_time
         }
         print(f"❌ Test failed: {e}")
     
     return result
 
-def save_results(results):
-    """Save test results to a file"""
+async def run_all(engine, on_result=None, checkpoint=None):
+    """Run all test scenarios, keeping at most MAX_IN_FLIGHT in flight
+    
+    on_result, if given, is called with each result in scenario order as soon
+    as it and all earlier scenarios have finished. Scenarios found in the
+    checkpoint are not run again.
+    """
+    semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+    tasks = [asyncio.create_task(run_test(engine, scenario, i, semaphore, checkpoint))
+             for i, scenario in enumerate(TEST_SCENARIOS)]
+    
+    results = []
+    for i, task in enumerate(tasks):
+        result = await task
+        if on_result:
+            on_result(i, result)
+        results.append(result)
+    return results
+
+def load_checkpoint(model_path, settings):
+    """Load the successful results of an earlier run with the same model and settings
+    
+    Returns:
+        Dictionary mapping scenario names to their checkpoint entries, limited
+        to scenarios whose prompt and max_tokens are unchanged
+    """
+    try:
+        with open(CHECKPOINT_PATH, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    if checkpoint.get("model_path") != model_path or checkpoint.get("engine") != settings:
+        return {}
+    
+    entries = checkpoint.get("scenarios", {})
+    return {
+        scenario['name']: entries[scenario['name']]
+        for scenario in TEST_SCENARIOS
+        if scenario['name'] in entries
+        and entries[scenario['name']].get("prompt_hash") == scenario['_hash']
+        and entries[scenario['name']].get("max_tokens") == scenario.get('max_tokens')
+    }
+
+def save_checkpoint(model_path, settings, entries):
+    """Atomically write the checkpoint file"""
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = CHECKPOINT_PATH.with_name(CHECKPOINT_PATH.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"model_path": model_path, "engine": settings, "scenarios": entries}, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+def _indent_json(obj, prefix):
+    """Serialize obj with indent=2 for nesting at the given line prefix"""
+    if orjson is not None:
+        text = orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    else:
+        text = json.dumps(obj, indent=2)
+    return text.replace("\n", "\n" + prefix)
+
+def open_results(model_info):
+    """Create the results file and write everything before the scenarios
+    
+    The file has the same layout as json.dump(results, f, indent=2), but the
+    scenarios are appended as they finish so partial results survive a crash.
+    """
     # Create output directory if it doesn't exist
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     # Generate a timestamp for the filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{OUTPUT_DIR}/model_test_results_{timestamp}.json"
+    filename = OUTPUT_DIR / f"model_test_results_{timestamp}.json"
+    
+    f = open(filename, 'w', encoding='utf-8')
+    f.write('{\n  "model_info": ' + _indent_json(model_info, "  ") + ',\n  "scenarios": [')
+    f.flush()
+    return f, filename
+
+def append_result(f, index, result):
+    """Append one scenario result to the results file"""
+    f.write(("," if index else "") + "\n    " + _indent_json(result, "    "))
+    f.flush()
+
+def close_results(f, count):
+    """Write the end of the results file and close it"""
+    f.write(("\n  ]" if count else "]") + "\n}")
+    f.close()
+
+def save_summary_table(results, results_file):
+    """Save one flat row per scenario next to the JSON results
+    
+    Returns:
+        Path of the Parquet file, or of a CSV file if pyarrow is unavailable
+    """
+    rows = [{
+        "name": r['name'],
+        "prompt_hash": r.get('prompt_hash'),
+        "success": r['success'],
+        "timed_out": r.get('timed_out', False),
+        "resumed": r.get('resumed', False),
+        "elapsed_time": r['elapsed_time'],
+        "coverage": r.get('topics_coverage_pct', 0.0)
+    } for r in results['scenarios']]
     
-    with open(filename, 'w') as f:
-        json.dump(results, f, indent=2)
+    if pyarrow is not None:
+        table_file = results_file.with_suffix(".parquet")
+        pq.write_table(pyarrow.Table.from_pylist(rows), table_file, compression='zstd')
+    else:
+        table_file = results_file.with_suffix(".csv")
+        with open(table_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=["name", "prompt_hash", "success", "timed_out", "resumed", "elapsed_time", "coverage"])
+            writer.writeheader()
+            writer.writerows(rows)
     
-    print(f"\nResults saved to {filename}")
-    return filename
+    print(f"Summary table saved to {table_file}")
+    return table_file
 
 def print_summary(results):
     """Print a summary of the test results"""
@@ -266,14 +493,20 @@ def print_summary(results):
     print(f"Model: {results['model_info']['name']}")
     print(f"Tests completed: {successful_tests}/{total_tests}")
     
+    resumed_tests = sum(1 for r in results['scenarios'] if r.get('resumed'))
+    if resumed_tests:
+        print(f"Reused from an earlier run: {resumed_tests}")
+    
     if successful_tests > 0:
-        # Calculate average time
-        avg_time = sum(r['elapsed_time'] for r in results['scenarios'] if r['success']) / successful_tests
-        print(f"Average response time: {avg_time:.2f} seconds")
+        # Calculate average time, over the scenarios measured in this run
+        times = [r['elapsed_time'] for r in results['scenarios'] if r['success'] and not r.get('resumed')]
+        if times:
+            avg_time = sum(times) / len(times)
+            print(f"Average response time: {avg_time:.2f} seconds")
         
         # Calculate average topic coverage
-        coverage_values = [float(r['topics_coverage'].strip('%')) for r in results['scenarios'] 
-                          if r['success'] and 'topics_coverage' in r]
+        coverage_values = [r['topics_coverage_pct'] for r in results['scenarios']
+                          if r['success'] and 'topics_coverage_pct' in r]
         if coverage_values:
             avg_coverage = sum(coverage_values) / len(coverage_values)
             print(f"Average topic coverage: {avg_coverage:.1f}%")
@@ -281,14 +514,19 @@ def print_summary(results):
     print("\nPer-scenario results:")
     for i, scenario in enumerate(results['scenarios']):
         status = "✅" if scenario['success'] else "❌"
-        name = scenario['name']
+        name = scenario['name'] + (" (reused)" if scenario.get('resumed') else "")
         coverage = scenario.get('topics_coverage', 'N/A')
         print(f"{status} {name} - Coverage: {coverage}")
     
     print("=" * 80)
 
-def main():
+def main(argv=None):
     """Run model testing"""
+    parser = argparse.ArgumentParser(description="Test the LLM on security analysis scenarios")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the checkpoint of an interrupted run and run every scenario")
+    args = parser.parse_args(argv)
+    
     print("=" * 80)
     print("Llama 3 8B Instruct Model Testing for Security Analysis")
     print("=" * 80)
@@ -309,28 +547,71 @@ def main():
     model_name = os.path.basename(model_path)
     
     # Initialize the LLM engine
-    engine = init_llm_engine(model_path)
+    settings = engine_settings(config.get('llm'))
+    engine = init_llm_engine(model_path, config.get('llm'))
     if not engine:
         print("Failed to initialize LLM engine.")
         return
     
+    # Warm up the model so one-time setup costs are not counted in the first scenario
+    warmup_start = time.perf_counter()
+    try:
+        engine.generate("Warmup.", max_tokens=8)
+    except Exception as e:
+        print(f"Warning: Warmup generation failed: {e}")
+    warmup_time = time.perf_counter() - warmup_start
+    print(f"Warmup completed in {warmup_time:.2f} seconds")
+    
     # Prepare results container
     results = {
         "model_info": {
             "name": model_name,
             "path": model_path,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "warmup_time": warmup_time
         },
         "scenarios": []
     }
     
-    # Run tests
-    for i, scenario in enumerate(TEST_SCENARIOS):
-        result = run_test(engine, scenario, i)
+    # Resume from the checkpoint of an interrupted run, if any
+    checkpoint = {} if args.fresh else load_checkpoint(model_path, settings)
+    if checkpoint:
+        print(f"Resuming: {len(checkpoint)} scenario(s) already completed")
+    
+    def record_result(index, result):
+        """Write a finished scenario to the results file and the checkpoint"""
         results['scenarios'].append(result)
+        append_result(f, index, result)
+        
+        # Reused results are already in the checkpoint
+        if result.get('resumed'):
+            return
+        
+        scenario = TEST_SCENARIOS[index]
+        if result['success']:
+            checkpoint[scenario['name']] = {
+                "prompt_hash": scenario['_hash'],
+                "max_tokens": scenario.get('max_tokens'),
+                "result": result
+            }
+        else:
+            checkpoint.pop(scenario['name'], None)
+        save_checkpoint(model_path, settings, checkpoint)
+    
+    # Run tests, writing each result to the results file as it finishes
+    f, results_file = open_results(results['model_info'])
+    try:
+        asyncio.run(run_all(engine, record_result, checkpoint))
+    finally:
+        close_results(f, len(results['scenarios']))
+    print(f"\nResults saved to {results_file}")
+    save_summary_table(results, results_file)
+    
+    # A fully successful run starts fresh next time
+    if all(r['success'] for r in results['scenarios']):
+        CHECKPOINT_PATH.unlink(missing_ok=True)
     
-    # Save and summarize results
-    results_file = save_results(results)
+    # Summarize results
     print_summary(results)
     
     print(f"\nTest completed. You can view detailed results in {results_file}")